@@ -1,15 +1,32 @@
+import argparse
 import dash
 from dash import dcc, html, ctx
 from dash.dependencies import Input, Output, State
 import plotly.graph_objs as plt
 import pandas as pd
+import numpy as np
 import requests
 import time
 import threading
 import datetime
+import hashlib
+import io
+import sys
 import os
 import json
+import math
+import re
+import socket
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dash.exceptions import PreventUpdate
+from dateutil import tz
+from flask import Response, jsonify, request
+
+try:
+    import pyarrow as pa
+except ImportError:  # Exportação em Arrow IPC é opcional
+    pa = None
 
 # Constantes
 CRYPTO_SYMBOLS = ['BTC', 'ETH', 'USDD', 'SOL']
@@ -19,16 +36,469 @@ CRYPTO_NAMES = {
     'USDD': 'Dólar Digital',
     'SOL': 'Solana'
 }
-UPDATE_INTERVAL = 60  # segundos
+COINGECKO_IDS = {
+    'BTC': 'bitcoin',
+    'ETH': 'ethereum',
+    'USDD': 'usdd',
+    'SOL': 'solana'
+}
+COINGECKO_API_URL = 'https://api.coingecko.com/api/v3'
+QUOTE_CURRENCIES = ['brl', 'usd', 'eur']  # Moedas de cotação buscadas na mesma requisição
+DEFAULT_CURRENCY = 'brl'
+CURRENCY_SYMBOLS = {
+    'brl': 'R$',
+    'usd': 'US$',
+    'eur': '€'
+}
+LOCAL_TIMEZONE = tz.tzlocal()  # Fuso do sistema, com horário de verão (o histórico usa hora local)
+UPDATE_INTERVAL = 60  # segundos (aceita intervalos abaixo de 1 minuto, ex: 15)
+API_RATE_LIMIT = 30  # requisições por minuto permitidas pela API
+MAX_BACKOFF = 600  # espera máxima em segundos após respostas 429
+REQUEST_TIMEOUT = 10  # segundos
+SERVER_PORT = 8050
 DATA_FILE = 'crypto_data.csv'
 ALERTS_FILE = 'crypto_alerts.json'  # Arquivo para armazenar os alertas
+BACKFILL_FILE = 'crypto_backfill.jsonl'  # Blocos baixados por uma importação em andamento
+BACKFILL_RESOLUTION = '5min'  # Resolução das linhas importadas
+EXPORT_CHUNK_ROWS = 10000  # Linhas por bloco nas exportações
+PERCENT_ALERT_WINDOW = datetime.timedelta(days=1)  # Janela usada pelos alertas percentuais
+
+# Nome da coluna de preço de uma criptomoeda em uma moeda de cotação (BRL usa só o símbolo)
+def price_column(symbol, currency=DEFAULT_CURRENCY):
+    if currency == DEFAULT_CURRENCY:
+        return symbol
+    return f"{symbol}_{currency.upper()}"
+
+PRICE_COLUMNS = [price_column(symbol, currency) for currency in QUOTE_CURRENCIES for symbol in CRYPTO_SYMBOLS]
+
+# Indicadores incrementais usados pelas regras de alerta
+class ConstantIndicator:
+    def __init__(self, value):
+        self.value = value
+    
+    def update(self, timestamp, price):
+        pass
+
+class PriceIndicator:
+    def __init__(self):
+        self.value = np.nan
+    
+    def update(self, timestamp, price):
+        self.value = price
+
+class EMAIndicator:
+    def __init__(self, period):
+        self.alpha = 2.0 / (period + 1)
+        self.value = np.nan
+    
+    def update(self, timestamp, price):
+        if np.isnan(self.value):
+            self.value = price
+        else:
+            self.value += self.alpha * (price - self.value)
+
+class ChangeIndicator:
+    """Variação percentual em relação ao primeiro preço dentro da janela"""
+    def __init__(self, window):
+        self.window = window  # nanossegundos
+        self.ticks = deque()
+        self.value = np.nan
+    
+    def update(self, timestamp, price):
+        self.ticks.append((timestamp, price))
+        while self.ticks[0][0] < timestamp - self.window:
+            self.ticks.popleft()
+        start_price = self.ticks[0][1]
+        self.value = (price - start_price) / start_price * 100 if start_price else np.nan
+
+class VolatilityIndicator:
+    """Desvio padrão (%) dos retornos entre ticks dentro da janela"""
+    def __init__(self, window):
+        self.window = window  # nanossegundos
+        self.returns = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.last_price = None
+        self.value = np.nan
+    
+    def update(self, timestamp, price):
+        if self.last_price:
+            change = (price - self.last_price) / self.last_price * 100
+            self.returns.append((timestamp, change))
+            self.total += change
+            self.total_sq += change * change
+        self.last_price = price
+        
+        while self.returns and self.returns[0][0] < timestamp - self.window:
+            _, old = self.returns.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+        
+        n = len(self.returns)
+        if n < 2:
+            self.value = np.nan
+        else:
+            variance = (self.total_sq - self.total * self.total / n) / (n - 1)
+            self.value = np.sqrt(max(variance, 0.0))
+
+# Analisador da linguagem de regras de alerta
+class RuleParser:
+    """Converte expressões como "SOL.change(24h) >= 5 AND BTC CROSSES ABOVE BTC.ema(50)"
+    em uma árvore de comparações entre séries.
+    
+    Séries: SYMBOL (preço em BRL; BTC_USD e BTC_EUR para outras moedas), SYMBOL.ema(N),
+    SYMBOL.change(janela), SYMBOL.volatility(janela) e números. Janelas usam as unidades s, m, h, d e w (ex: 30m, 1h, 24h).
+    Operadores: >, <, >=, <=, CROSSES, CROSSES ABOVE, CROSSES BELOW, AND, OR, NOT e parênteses.
+    """
+    TOKEN_RE = re.compile(r"\s*(?:(\d+(?:\.\d+)?)([smhdw%])?(?![A-Za-z0-9_])|([A-Za-z_][A-Za-z0-9_]*)|(>=|<=|[<>().,-]))")
+    UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    FUNCTIONS = ('ema', 'change', 'volatility')
+    
+    def __init__(self, symbols):
+        self.symbols = symbols
+    
+    def _tokenize(self, text):
+        tokens = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            match = self.TOKEN_RE.match(text, pos)
+            if not match or match.end() == pos:
+                raise ValueError(f"Caractere inesperado na posição {pos + 1}: '{text[pos:].strip()[:10]}'")
+            number, unit, name, op = match.groups()
+            if number is not None:
+                tokens.append(('number', float(number), unit))
+            elif name is not None:
+                tokens.append(('name', name, None))
+            else:
+                tokens.append(('op', op, None))
+            pos = match.end()
+        return tokens
+    
+    def parse(self, text):
+        """Retorna a árvore da regra e o conjunto de símbolos usados"""
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+        self.used_symbols = []
+        if not self.tokens:
+            raise ValueError("Regra vazia")
+        tree = self._parse_or()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Trecho inesperado: '{self.tokens[self.pos][1]}'")
+        return tree, self.used_symbols
+    
+    def _peek(self, offset=0):
+        if self.pos + offset < len(self.tokens):
+            return self.tokens[self.pos + offset]
+        return (None, None, None)
+    
+    def _keyword(self, word):
+        kind, value, _ = self._peek()
+        if kind == 'name' and value.upper() == word:
+            self.pos += 1
+            return True
+        return False
+    
+    def _expect_op(self, op):
+        kind, value, _ = self._peek()
+        if kind != 'op' or value != op:
+            raise ValueError(f"Esperado '{op}'")
+        self.pos += 1
+    
+    def _parse_or(self):
+        children = [self._parse_and()]
+        while self._keyword('OR'):
+            children.append(self._parse_and())
+        return children[0] if len(children) == 1 else ('or', children)
+    
+    def _parse_and(self):
+        children = [self._parse_not()]
+        while self._keyword('AND'):
+            children.append(self._parse_not())
+        return children[0] if len(children) == 1 else ('and', children)
+    
+    def _parse_not(self):
+        if self._keyword('NOT'):
+            return ('not', self._parse_not())
+        kind, value, _ = self._peek()
+        if kind == 'op' and value == '(':
+            self.pos += 1
+            tree = self._parse_or()
+            self._expect_op(')')
+            return tree
+        return self._parse_comparison()
+    
+    def _parse_comparison(self):
+        left = self._parse_operand()
+        kind, value, _ = self._peek()
+        if kind == 'op' and value in ('>', '<', '>=', '<='):
+            self.pos += 1
+            op = value
+        elif self._keyword('CROSSES'):
+            if self._keyword('ABOVE'):
+                op = 'crosses_above'
+            elif self._keyword('BELOW'):
+                op = 'crosses_below'
+            else:
+                op = 'crosses'
+        else:
+            raise ValueError("Esperado um operador de comparação (>, <, >=, <=, CROSSES)")
+        right = self._parse_operand()
+        return ('cmp', op, left, right)
+    
+    def _parse_operand(self):
+        kind, value, unit = self._peek()
+        sign = 1
+        if kind == 'op' and value == '-':
+            self.pos += 1
+            sign = -1
+            kind, value, unit = self._peek()
+        if kind == 'number':
+            if unit not in (None, '%'):
+                raise ValueError(f"Janela de tempo só pode ser usada como argumento: {value:g}{unit}")
+            self.pos += 1
+            return ('const', sign * value)
+        if kind == 'name' and sign == 1:
+            symbol = value.upper()
+            if symbol not in self.symbols:
+                raise ValueError(f"Criptomoeda desconhecida: {value}")
+            self.pos += 1
+            if symbol not in self.used_symbols:
+                self.used_symbols.append(symbol)
+            kind, value, _ = self._peek()
+            if kind != 'op' or value != '.':
+                return ('price', symbol)
+            self.pos += 1
+            kind, function, _ = self._peek()
+            if kind != 'name' or function.lower() not in self.FUNCTIONS:
+                raise ValueError(f"Função desconhecida. Use: {', '.join(self.FUNCTIONS)}")
+            function = function.lower()
+            self.pos += 1
+            self._expect_op('(')
+            kind, argument, unit = self._peek()
+            if kind != 'number':
+                raise ValueError(f"Argumento inválido para {function}")
+            self.pos += 1
+            self._expect_op(')')
+            if function == 'ema':
+                if unit is not None or argument < 1 or not argument.is_integer():
+                    raise ValueError("ema espera um número de períodos, ex: ema(50)")
+                return ('ema', symbol, int(argument))
+            if unit not in self.UNITS:
+                raise ValueError(f"{function} espera uma janela de tempo, ex: {function}(1h)")
+            return (function, symbol, int(argument * self.UNITS[unit] * 1_000_000_000))
+        raise ValueError("Esperado um número ou uma criptomoeda")
+
+# Classe para avaliar regras compostas de alerta de forma incremental
+class RuleEngine:
+    """Compila regras em avaliadores que compartilham indicadores.
+    
+    Cada série (ex: BTC.ema(50)) é calculada uma única vez por tick, não importa quantas
+    regras a usem, e todas as comparações são avaliadas juntas com NumPy.
+    """
+    OPERATORS = ('>', '<', '>=', '<=', 'crosses_above', 'crosses_below', 'crosses')
+    
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.parser = RuleParser(symbols)
+        # Reentrante: protege o analisador, a lista de regras e o estado dos indicadores
+        self.lock = threading.RLock()
+        self.parsed = {}  # {expressão: (árvore, símbolos)}
+        self.expressions = []
+        self.indicators = {}  # {chave da série: indicador}
+        self.pending_warmup = set()  # chaves de séries ainda sem histórico
+        self.previous_diffs = {}  # {chave da comparação: diferença no tick anterior}
+        self.last_timestamp = None  # último tick processado (ns)
+        self.dirty = True
+    
+    def parse(self, expression):
+        """Valida e retorna (árvore, símbolos) de uma regra, com cache"""
+        with self.lock:
+            if expression not in self.parsed:
+                self.parsed[expression] = self.parser.parse(expression)
+            return self.parsed[expression]
+    
+    def set_rules(self, expressions):
+        """Define a lista de regras a serem avaliadas"""
+        with self.lock:
+            self.expressions = list(expressions)
+            # Descarta do cache as regras que não são mais usadas
+            self.parsed = {e: tree for e, tree in self.parsed.items() if e in self.expressions}
+            self.dirty = True
+    
+    def _new_indicator(self, key):
+        kind = key[0]
+        if kind == 'const':
+            return ConstantIndicator(key[1])
+        if kind == 'price':
+            return PriceIndicator()
+        if kind == 'ema':
+            return EMAIndicator(key[2])
+        if kind == 'change':
+            return ChangeIndicator(key[2])
+        return VolatilityIndicator(key[2])
+    
+    def _build(self, tree, indicators, comparisons):
+        """Transforma a árvore de uma regra em uma função sobre o vetor de comparações"""
+        kind = tree[0]
+        if kind == 'cmp':
+            _, op, left, right = tree
+            for key in (left, right):
+                if key not in indicators:
+                    if key in self.indicators:
+                        indicators[key] = self.indicators[key]
+                    else:
+                        indicators[key] = self._new_indicator(key)
+                        if key[0] != 'const':
+                            self.pending_warmup.add(key)
+            comparisons.setdefault((op, left, right), len(comparisons))
+            index = comparisons[(op, left, right)]
+            return lambda results: results[index]
+        if kind == 'not':
+            child = self._build(tree[1], indicators, comparisons)
+            return lambda results: not child(results)
+        children = [self._build(child, indicators, comparisons) for child in tree[1]]
+        if kind == 'and':
+            return lambda results: all(child(results) for child in children)
+        return lambda results: any(child(results) for child in children)
+    
+    def _compile(self):
+        indicators = {}
+        comparisons = {}
+        self.evaluators = [self._build(self.parse(e)[0], indicators, comparisons)
+                           for e in self.expressions]
+        
+        # Descarta indicadores que nenhuma regra usa mais
+        self.indicators = indicators
+        self.pending_warmup &= set(indicators)
+        self.node_keys = list(indicators)
+        node_index = {key: i for i, key in enumerate(self.node_keys)}
+        self.nodes = [indicators[key] for key in self.node_keys]
+        self.nodes_by_symbol = {symbol: [] for symbol in self.symbols}
+        for key, indicator in indicators.items():
+            if key[0] != 'const':
+                self.nodes_by_symbol[key[1]].append(indicator)
+        
+        self.comparison_keys = list(comparisons)
+        self.left = np.array([node_index[key[1]] for key in self.comparison_keys], dtype=np.int64)
+        self.right = np.array([node_index[key[2]] for key in self.comparison_keys], dtype=np.int64)
+        self.op_indices = {
+            op: np.array([i for i, key in enumerate(self.comparison_keys) if key[0] == op], dtype=np.int64)
+            for op in self.OPERATORS
+        }
+        self.previous_diffs = {key: self.previous_diffs.get(key, np.nan) for key in self.comparison_keys}
+        self.dirty = False
+    
+    def _warmup(self, data_manager):
+        """Alimenta séries novas com o histórico já armazenado"""
+        for symbol in {key[1] for key in self.pending_warmup}:
+            keys = [key for key in self.pending_warmup if key[1] == symbol]
+            times, prices = data_manager.get_history_arrays(symbol)
+            times = times.view(np.int64)
+            if self.last_timestamp is not None:
+                end = np.searchsorted(times, self.last_timestamp, side='right')
+                times, prices = times[:end], prices[:end]
+            for key in keys:
+                indicator = self.indicators[key]
+                for timestamp, price in zip(times.tolist(), prices.tolist()):
+                    indicator.update(timestamp, price)
+        self.pending_warmup = set()
+    
+    def _current_diffs(self):
+        values = np.fromiter((node.value for node in self.nodes), dtype=float, count=len(self.nodes))
+        return values[self.left] - values[self.right]
+    
+    def _evaluate_comparisons(self, diffs, previous):
+        results = np.zeros(len(diffs), dtype=bool)
+        for op, indices in self.op_indices.items():
+            if len(indices) == 0:
+                continue
+            diff = diffs[indices]
+            before = previous[indices]
+            if op == '>':
+                results[indices] = diff > 0
+            elif op == '<':
+                results[indices] = diff < 0
+            elif op == '>=':
+                results[indices] = diff >= 0
+            elif op == '<=':
+                results[indices] = diff <= 0
+            else:
+                # Mesma regra de cruzamento de check_alerts: anterior < alvo <= atual
+                above = (before < 0) & (diff >= 0)
+                below = (before > 0) & (diff <= 0)
+                if op == 'crosses_above':
+                    results[indices] = above
+                elif op == 'crosses_below':
+                    results[indices] = below
+                else:
+                    results[indices] = above | below
+        return results
+    
+    def evaluate(self, data_manager, active):
+        """Processa os ticks novos e retorna os índices das regras ativas que foram satisfeitas
+        
+        active: índices das regras que ainda podem disparar. Cada tick é processado uma
+        única vez, mesmo que este método seja chamado várias vezes.
+        """
+        with self.lock:
+            if self.dirty:
+                self._compile()
+            if not self.expressions:
+                self.last_timestamp = data_manager.get_last_timestamp()
+                return []
+            if self.last_timestamp is None:
+                self.last_timestamp = data_manager.get_last_timestamp()
+            if self.pending_warmup:
+                self._warmup(data_manager)
+                # Séries recém-criadas começam a comparar a partir do estado atual
+                diffs = self._current_diffs()
+                for i, key in enumerate(self.comparison_keys):
+                    if np.isnan(self.previous_diffs[key]):
+                        self.previous_diffs[key] = diffs[i]
+            
+            times, prices = data_manager.get_ticks_since(self.last_timestamp, self.symbols)
+            if len(times) == 0:
+                return []
+            self.last_timestamp = int(times[-1])
+            
+            previous = np.array([self.previous_diffs[key] for key in self.comparison_keys], dtype=float)
+            pending = sorted(set(active))
+            fired = []
+            for timestamp, row in zip(times.tolist(), prices.tolist()):
+                for symbol, price in zip(self.symbols, row):
+                    if not np.isnan(price):
+                        for node in self.nodes_by_symbol[symbol]:
+                            node.update(timestamp, price)
+                
+                diffs = self._current_diffs()
+                results = self._evaluate_comparisons(diffs, previous)
+                # Mantém a última diferença conhecida quando uma série ainda não tem valor
+                previous = np.where(np.isnan(diffs), previous, diffs)
+                
+                remaining = []
+                for i in pending:
+                    if self.evaluators[i](results):
+                        fired.append(i)
+                    else:
+                        remaining.append(i)
+                pending = remaining
+            
+            self.previous_diffs = dict(zip(self.comparison_keys, previous.tolist()))
+            return fired
 
 # Classe para gerenciar alertas de preço
 class AlertManager:
     def __init__(self):
-        self.price_alerts = {}  # {symbol: [{value: float, triggered: bool}, ...]}
-        self.percent_alerts = {}  # {symbol: [{percent: float, triggered: bool}, ...]}
+        self.price_alerts = {}  # {symbol: [{value: float, currency: str, triggered: bool}, ...]}
+        self.percent_alerts = {}  # {symbol: [{percent: float, currency: str, triggered: bool}, ...]}
+        self.rule_alerts = []  # [{expression: str, triggered: bool}, ...]
+        self.rule_engine = RuleEngine(PRICE_COLUMNS)
         self.triggered_alerts = []  # Lista de alertas acionados recentemente
+        self.pending_notifications = []  # Alertas acionados ainda não exibidos na interface
+        self.notifications_lock = threading.Lock()
+        self.check_lock = threading.Lock()  # A coleta e a interface podem verificar ao mesmo tempo
+        self.last_checked_timestamp = None  # Último tick já verificado (ns)
         self.load_alerts()
     
     def load_alerts(self):
@@ -39,14 +509,23 @@ class AlertManager:
                     data = json.load(f)
                     self.price_alerts = data.get('price_alerts', {})
                     self.percent_alerts = data.get('percent_alerts', {})
+                    self.rule_alerts = []
+                    for alert in data.get('rule_alerts', []):
+                        try:
+                            self.rule_engine.parse(alert['expression'])
+                            self.rule_alerts.append(alert)
+                        except ValueError as e:
+                            print(f"Regra inválida ignorada '{alert['expression']}': {e}")
             except Exception as e:
                 print(f"Erro ao carregar alertas: {e}")
+        self.rule_engine.set_rules([alert['expression'] for alert in self.rule_alerts])
         
     def save_alerts(self):
         """Salva alertas no arquivo JSON"""
         data = {
             'price_alerts': self.price_alerts,
-            'percent_alerts': self.percent_alerts
+            'percent_alerts': self.percent_alerts,
+            'rule_alerts': self.rule_alerts
         }
         try:
             with open(ALERTS_FILE, 'w') as f:
@@ -54,14 +533,15 @@ class AlertManager:
         except Exception as e:
             print(f"Erro ao salvar alertas: {e}")
     
-    def add_price_alert(self, symbol, price_value):
+    def add_price_alert(self, symbol, price_value, currency=DEFAULT_CURRENCY):
         """Adiciona um alerta de preço específico"""
         if symbol not in self.price_alerts:
             self.price_alerts[symbol] = []
         
         # Verifica se já existe um alerta para este preço
         for alert in self.price_alerts[symbol]:
-            if abs(alert['value'] - price_value) < 0.01:
+            if abs(alert['value'] - price_value) < 0.01 and \
+               alert.get('currency', DEFAULT_CURRENCY) == currency:
                 # Alerta semelhante já existe, reseta o estado
                 alert['triggered'] = False
                 self.save_alerts()
@@ -70,19 +550,21 @@ class AlertManager:
         # Adiciona novo alerta
         self.price_alerts[symbol].append({
             'value': price_value,
+            'currency': currency,
             'triggered': False
         })
         self.save_alerts()
         return True
     
-    def add_percent_alert(self, symbol, percent_value):
+    def add_percent_alert(self, symbol, percent_value, currency=DEFAULT_CURRENCY):
         """Adiciona um alerta de variação percentual"""
         if symbol not in self.percent_alerts:
             self.percent_alerts[symbol] = []
         
         # Verifica se já existe um alerta para esta porcentagem
         for alert in self.percent_alerts[symbol]:
-            if abs(alert['percent'] - percent_value) < 0.01:
+            if abs(alert['percent'] - percent_value) < 0.01 and \
+               alert.get('currency', DEFAULT_CURRENCY) == currency:
                 # Alerta semelhante já existe, reseta o estado
                 alert['triggered'] = False
                 self.save_alerts()
@@ -91,11 +573,45 @@ class AlertManager:
         # Adiciona novo alerta
         self.percent_alerts[symbol].append({
             'percent': percent_value,
+            'currency': currency,
             'triggered': False
         })
         self.save_alerts()
         return True
     
+    def add_rule_alert(self, expression):
+        """Adiciona um alerta por regra composta (lança ValueError se a regra for inválida)"""
+        expression = ' '.join(expression.split())
+        
+        # O lock do motor também protege a lista de regras contra check_alerts concorrente
+        with self.rule_engine.lock:
+            self.rule_engine.parse(expression)
+            
+            # Verifica se já existe um alerta com a mesma regra
+            for alert in self.rule_alerts:
+                if alert['expression'] == expression:
+                    alert['triggered'] = False
+                    self.save_alerts()
+                    return True
+            
+            self.rule_alerts.append({
+                'expression': expression,
+                'triggered': False
+            })
+            self.rule_engine.set_rules([alert['expression'] for alert in self.rule_alerts])
+            self.save_alerts()
+        return True
+    
+    def remove_rule_alert(self, alert_index):
+        """Remove um alerta por regra composta"""
+        with self.rule_engine.lock:
+            if 0 <= alert_index < len(self.rule_alerts):
+                self.rule_alerts.pop(alert_index)
+                self.rule_engine.set_rules([alert['expression'] for alert in self.rule_alerts])
+                self.save_alerts()
+                return True
+        return False
+    
     def remove_price_alert(self, symbol, alert_index):
         """Remove um alerta de preço específico"""
         if symbol in self.price_alerts and 0 <= alert_index < len(self.price_alerts[symbol]):
@@ -114,70 +630,113 @@ class AlertManager:
     
     def check_alerts(self, data_manager):
         """Verifica se algum alerta foi acionado"""
+        with self.check_lock:
+            return self._check_alerts(data_manager)
+    
+    def _check_alerts(self, data_manager):
         self.triggered_alerts = []
+        self.last_checked_timestamp = data_manager.get_last_timestamp()
         latest_prices = data_manager.get_latest_prices()
         
         # Verifica alertas de preço específico
         for symbol, alerts in self.price_alerts.items():
-            current_price = latest_prices.get(symbol)
-            if current_price is not None:
-                for alert in alerts:
-                    if not alert['triggered']:
-                        target_price = alert['value']
-                        # Verifica se o preço cruzou o valor do alerta (para cima ou para baixo)
-                        # Para isso, precisamos do preço anterior
-                        df = data_manager.get_historical_data(symbol, '1h')
-                        if len(df) >= 2:
-                            previous_price = df.iloc[-2][symbol] if len(df) > 1 else df.iloc[0][symbol]
-                            
-                            # Cruzamento para cima
-                            if previous_price < target_price <= current_price:
-                                self.triggered_alerts.append({
-                                    'symbol': symbol,
-                                    'type': 'price',
-                                    'message': f"{CRYPTO_NAMES[symbol]} atingiu R$ {target_price:,.2f} (preço atual: R$ {current_price:,.2f})"
-                                })
-                                alert['triggered'] = True
-                            
-                            # Cruzamento para baixo
-                            elif previous_price > target_price >= current_price:
-                                self.triggered_alerts.append({
-                                    'symbol': symbol,
-                                    'type': 'price',
-                                    'message': f"{CRYPTO_NAMES[symbol]} caiu para R$ {target_price:,.2f} (preço atual: R$ {current_price:,.2f})"
-                                })
-                                alert['triggered'] = True
+            for alert in alerts:
+                if not alert['triggered']:
+                    currency = alert.get('currency', DEFAULT_CURRENCY)
+                    column = price_column(symbol, currency)
+                    current_price = latest_prices.get(column)
+                    if current_price is None or pd.isna(current_price):
+                        continue
+                    target_price = alert['value']
+                    currency_symbol = CURRENCY_SYMBOLS[currency]
+                    # Verifica se o preço cruzou o valor do alerta (para cima ou para baixo)
+                    # Para isso, precisamos do preço anterior
+                    df = data_manager.get_historical_data(column, '1h')
+                    if len(df) >= 2:
+                        previous_price = df.iloc[-2][column] if len(df) > 1 else df.iloc[0][column]
+                        
+                        # Cruzamento para cima
+                        if previous_price < target_price <= current_price:
+                            self.triggered_alerts.append({
+                                'symbol': symbol,
+                                'type': 'price',
+                                'message': f"{CRYPTO_NAMES[symbol]} atingiu {currency_symbol} {target_price:,.2f} (preço atual: {currency_symbol} {current_price:,.2f})"
+                            })
+                            alert['triggered'] = True
+                        
+                        # Cruzamento para baixo
+                        elif previous_price > target_price >= current_price:
+                            self.triggered_alerts.append({
+                                'symbol': symbol,
+                                'type': 'price',
+                                'message': f"{CRYPTO_NAMES[symbol]} caiu para {currency_symbol} {target_price:,.2f} (preço atual: {currency_symbol} {current_price:,.2f})"
+                            })
+                            alert['triggered'] = True
         
         # Verifica alertas de variação percentual
         for symbol, alerts in self.percent_alerts.items():
-            df = data_manager.get_historical_data(symbol, '1d')
-            if not df.empty and len(df) > 1:
-                start_price = df.iloc[0][symbol]
-                current_price = latest_prices.get(symbol)
+            current_percents = {}  # Variação por moeda de cotação, calculada uma vez
+            for alert in alerts:
+                if alert['triggered']:
+                    continue
+                currency = alert.get('currency', DEFAULT_CURRENCY)
+                if currency not in current_percents:
+                    column = price_column(symbol, currency)
+                    current_percents[currency] = None
+                    df = data_manager.get_historical_data(column, '1d')
+                    if not df.empty and len(df) > 1:
+                        start_price = df.iloc[0][column]
+                        current_price = latest_prices.get(column)
+                        if start_price and current_price and not pd.isna(current_price):
+                            current_percents[currency] = ((current_price - start_price) / start_price) * 100
+                current_percent = current_percents[currency]
+                if current_percent is None:
+                    continue
                 
-                if start_price and current_price:
-                    current_percent = ((current_price - start_price) / start_price) * 100
+                target_percent = alert['percent']
+                
+                # Verifica se a variação percentual atingiu o valor do alerta
+                if (target_percent > 0 and current_percent >= target_percent) or \
+                   (target_percent < 0 and current_percent <= target_percent):
                     
-                    for alert in alerts:
-                        if not alert['triggered']:
-                            target_percent = alert['percent']
-                            
-                            # Verifica se a variação percentual atingiu o valor do alerta
-                            if (target_percent > 0 and current_percent >= target_percent) or \
-                               (target_percent < 0 and current_percent <= target_percent):
-                                
-                                direction = "subiu" if target_percent > 0 else "caiu"
-                                self.triggered_alerts.append({
-                                    'symbol': symbol,
-                                    'type': 'percent',
-                                    'message': f"{CRYPTO_NAMES[symbol]} {direction} {abs(target_percent):.2f}% hoje (variação atual: {current_percent:+.2f}%)"
-                                })
-                                alert['triggered'] = True
+                    direction = "subiu" if target_percent > 0 else "caiu"
+                    self.triggered_alerts.append({
+                        'symbol': symbol,
+                        'type': 'percent',
+                        'message': f"{CRYPTO_NAMES[symbol]} {direction} {abs(target_percent):.2f}% hoje em {currency.upper()} (variação atual: {current_percent:+.2f}%)"
+                    })
+                    alert['triggered'] = True
+        
+        # Verifica alertas por regra composta nos ticks ainda não avaliados
+        with self.rule_engine.lock:
+            active = [i for i, alert in enumerate(self.rule_alerts) if not alert['triggered']]
+            for i in self.rule_engine.evaluate(data_manager, active):
+                alert = self.rule_alerts[i]
+                symbols = self.rule_engine.parse(alert['expression'])[1]
+                self.triggered_alerts.append({
+                    'symbol': symbols[0].split('_')[0] if symbols else '',
+                    'type': 'rule',
+                    'message': f"Regra acionada: {alert['expression']}"
+                })
+                alert['triggered'] = True
         
         if self.triggered_alerts:
             self.save_alerts()
+            with self.notifications_lock:
+                self.pending_notifications.extend(self.triggered_alerts)
         
         return self.triggered_alerts
+    
+    def has_new_data(self, data_manager):
+        """Indica se chegou uma linha nova desde a última verificação"""
+        return data_manager.get_last_timestamp() != self.last_checked_timestamp
+    
+    def pop_notifications(self):
+        """Retorna e limpa os alertas acionados desde a última chamada"""
+        with self.notifications_lock:
+            notifications = self.pending_notifications
+            self.pending_notifications = []
+        return notifications
 
 # Classe para gerenciar os dados de criptomoedas
 class CryptoDataManager:
@@ -185,6 +744,9 @@ class CryptoDataManager:
         self.symbols = symbols
         self.data = self._initialize_dataframe()
         self.lock = threading.Lock()
+        self.cross_rates = {}  # {base: {cotação: taxa}}, recalculado uma vez por coleta
+        self.last_status_code = None  # Status HTTP da última consulta à API
+        self.retry_after = None  # Espera sugerida pela API (Retry-After) em segundos
         
     def _initialize_dataframe(self):
         """Inicializa o DataFrame com dados históricos ou cria um novo"""
@@ -199,61 +761,115 @@ class CryptoDataManager:
         return df
     
     def fetch_prices(self):
-        """Busca os preços atuais das criptomoedas da API CoinGecko em Real (BRL)"""
+        """Busca os preços atuais das criptomoedas da API CoinGecko em todas as moedas de cotação
+        
+        Retorna {coluna: preço}, com as colunas definidas por price_column (ex: BTC, BTC_USD).
+        """
         prices = {}
         try:
             # Converter símbolos para IDs compatíveis com a API
-            symbol_to_id = {
-                'BTC': 'bitcoin',
-                'ETH': 'ethereum',
-                'USDD': 'usdd',
-                'SOL': 'solana'
-            }
+            ids = ','.join([COINGECKO_IDS[symbol] for symbol in self.symbols])
+            currencies = ','.join(QUOTE_CURRENCIES)
+            url = f"{COINGECKO_API_URL}/simple/price?ids={ids}&vs_currencies={currencies}"
             
-            ids = ','.join([symbol_to_id[symbol] for symbol in self.symbols])
-            url = f"https://api.coingecko.com/api/v3/simple/price?ids={ids}&vs_currencies=brl"
-            
-            response = requests.get(url)
-            if response.status_code == 200:
+            response = requests.get(url, timeout=REQUEST_TIMEOUT)
+            self.last_status_code = response.status_code
+            self.retry_after = None
+            if response.status_code == 429:
+                retry_after = response.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    self.retry_after = int(retry_after)
+                print("Limite de requisições da API atingido (429)")
+            elif response.status_code == 200:
                 data = response.json()
-                for symbol, coin_id in symbol_to_id.items():
+                for symbol, coin_id in COINGECKO_IDS.items():
                     if coin_id in data:
-                        prices[symbol] = data[coin_id]['brl']
+                        for currency in QUOTE_CURRENCIES:
+                            if currency in data[coin_id]:
+                                prices[price_column(symbol, currency)] = data[coin_id][currency]
             else:
                 print(f"Erro na API: {response.status_code}")
                 
         except Exception as e:
+            self.last_status_code = None
             print(f"Erro ao buscar preços: {e}")
             
         return prices
     
     def update_data(self):
-        """Atualiza o DataFrame com os preços mais recentes"""
+        """Atualiza o DataFrame com os preços mais recentes
+        
+        Retorna True se uma nova linha foi gravada e False se a busca falhou ou se os
+        preços são idênticos aos da última linha (nesse caso nada é gravado).
+        """
         prices = self.fetch_prices()
         if not prices:
-            return
+            return False
+        
+        # Câmbio calculado uma única vez por coleta e usado para completar cotações ausentes
+        cross_rates = self.compute_cross_rates(prices)
+        for symbol in self.symbols:
+            for currency in QUOTE_CURRENCIES:
+                column = price_column(symbol, currency)
+                if column in prices:
+                    continue
+                for source in QUOTE_CURRENCIES:
+                    source_column = price_column(symbol, source)
+                    if source_column in prices and currency in cross_rates.get(source, {}):
+                        prices[column] = prices[source_column] * cross_rates[source][currency]
+                        break
             
         timestamp = datetime.datetime.now()
         
         with self.lock:
+            self.cross_rates = cross_rates
+            if not self.data.empty:
+                last_row = self.data.iloc[-1]
+                if all(symbol in last_row.index and last_row[symbol] == price
+                       for symbol, price in prices.items()):
+                    return False
+            
             # Adiciona os novos preços ao DataFrame
             new_row = pd.Series(prices, name=timestamp)
             self.data = pd.concat([self.data, new_row.to_frame().T])
             
             # Salva os dados atualizados
             self.data.to_csv(DATA_FILE)
+        return True
+    
+    def compute_cross_rates(self, prices):
+        """Deriva o câmbio entre as moedas de cotação a partir das cotações das criptomoedas
+        
+        Retorna {base: {cotação: taxa}}, onde 1 unidade de base vale `taxa` da cotação. Usa a
+        mediana entre as criptomoedas para não depender de uma única cotação.
+        """
+        rates = {}
+        for base in QUOTE_CURRENCIES:
+            for quote in QUOTE_CURRENCIES:
+                ratios = [prices[price_column(symbol, quote)] / prices[price_column(symbol, base)]
+                          for symbol in self.symbols
+                          if prices.get(price_column(symbol, base)) and
+                          prices.get(price_column(symbol, quote)) is not None]
+                if ratios:
+                    rates.setdefault(base, {})[quote] = float(np.median(ratios))
+        return rates
+    
+    def get_cross_rates(self):
+        """Retorna o câmbio calculado na última coleta"""
+        with self.lock:
+            return self.cross_rates
     
     def get_latest_prices(self):
         """Retorna os preços mais recentes"""
         with self.lock:
             if not self.data.empty:
                 return self.data.iloc[-1].to_dict()
-            return {symbol: 0 for symbol in self.symbols}
+            return {column: 0 for column in PRICE_COLUMNS}
     
     def get_historical_data(self, symbol, period='1d'):
-        """Retorna dados históricos para uma criptomoeda específica"""
+        """Retorna dados históricos de uma coluna de preço (ex: BTC ou BTC_USD)"""
         with self.lock:
-            if self.data.empty:
+            if self.data.empty or symbol not in self.data.columns:
                 return pd.DataFrame()
                 
             df = self.data[[symbol]].copy()
@@ -272,6 +888,565 @@ class CryptoDataManager:
                 start_time = now - datetime.timedelta(days=1)  # padrão: 1 dia
                 
             return df[df.index >= start_time]
+    
+    def get_history_arrays(self, symbol):
+        """Retorna todo o histórico de uma criptomoeda como arrays NumPy (tempos, preços)"""
+        with self.lock:
+            if self.data.empty or symbol not in self.data.columns:
+                return np.array([], dtype='datetime64[ns]'), np.array([], dtype=float)
+            prices = pd.to_numeric(self.data[symbol], errors='coerce').to_numpy(dtype=float)
+            times = pd.to_datetime(self.data.index).to_numpy(dtype='datetime64[ns]')
+        
+        # Descarta ticks sem preço para esta moeda
+        valid = ~np.isnan(prices)
+        return times[valid], prices[valid]
+    
+    def snapshot(self):
+        """Retorna o DataFrame atual do histórico sem copiá-lo
+        
+        As gravações sempre substituem self.data por um novo DataFrame, então o objeto
+        retornado não muda e pode ser lido sem segurar o lock.
+        """
+        with self.lock:
+            return self.data
+    
+    def get_first_timestamp(self):
+        """Retorna o instante do primeiro tick armazenado (ou None)"""
+        with self.lock:
+            if self.data.empty:
+                return None
+            return pd.to_datetime(self.data.index).min()
+    
+    def bulk_insert(self, new_data):
+        """Mescla um bloco de linhas ao histórico em uma única inserção ordenada
+        
+        Linhas com instantes já existentes são descartadas. Retorna o número de linhas inseridas.
+        """
+        if new_data.empty:
+            return 0
+        with self.lock:
+            if not self.data.empty:
+                existing = pd.to_datetime(self.data.index)
+                new_data = new_data[~new_data.index.isin(existing)]
+                if new_data.empty:
+                    return 0
+                merged = pd.concat([self.data.set_axis(existing), new_data])
+            else:
+                merged = new_data
+            self.data = merged.sort_index(kind='mergesort')
+            self.data.to_csv(DATA_FILE)
+        return len(new_data)
+    
+    def get_last_timestamp(self):
+        """Retorna o instante do último tick armazenado em nanossegundos (ou None)"""
+        with self.lock:
+            if self.data.empty:
+                return None
+            return pd.Timestamp(self.data.index[-1]).value
+    
+    def get_ticks_since(self, since=None, columns=None):
+        """Retorna os ticks posteriores a `since` (ns): tempos em ns e matriz de preços por coluna"""
+        columns = self.symbols if columns is None else columns
+        with self.lock:
+            if self.data.empty:
+                return np.array([], dtype=np.int64), np.empty((0, len(columns)))
+            times = pd.to_datetime(self.data.index).asi8
+            start = 0 if since is None else np.searchsorted(times, since, side='right')
+            rows = self.data.iloc[start:].reindex(columns=columns)
+            prices = rows.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        return times[start:], prices
+
+# Classe para simular alertas sobre o histórico armazenado
+class AlertBacktester:
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+    
+    @staticmethod
+    def _crossings(values, thresholds, direction='both'):
+        """Encontra todos os cruzamentos de uma série com vários limites de uma só vez.
+        
+        Usa as mesmas regras de check_alerts: para cima quando anterior < alvo <= atual e
+        para baixo quando anterior > alvo >= atual. Retorna dois arrays alinhados com o
+        índice do tick e o índice do limite de cada cruzamento.
+        """
+        empty = np.array([], dtype=np.int64)
+        if len(values) < 2 or len(thresholds) == 0:
+            return empty, empty
+        
+        # Com os limites ordenados, os alvos cruzados em cada passo formam um intervalo contíguo
+        order = np.argsort(thresholds, kind='stable')
+        sorted_thresholds = thresholds[order]
+        previous = values[:-1]
+        current = values[1:]
+        valid = np.isfinite(previous) & np.isfinite(current)
+        
+        tick_parts, threshold_parts = [], []
+        bounds = []
+        if direction in ('up', 'both'):
+            bounds.append((np.searchsorted(sorted_thresholds, previous, side='right'),
+                           np.searchsorted(sorted_thresholds, current, side='right')))
+        if direction in ('down', 'both'):
+            bounds.append((np.searchsorted(sorted_thresholds, current, side='left'),
+                           np.searchsorted(sorted_thresholds, previous, side='left')))
+        
+        for low, high in bounds:
+            counts = np.where(valid, np.maximum(high - low, 0), 0)
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # Expande cada intervalo [low, high) em pares (tick, limite) sem laços em Python
+            steps = np.repeat(np.arange(len(counts)), counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            tick_parts.append(steps + 1)
+            threshold_parts.append(order[np.repeat(low, counts) + offsets])
+        
+        if not tick_parts:
+            return empty, empty
+        return np.concatenate(tick_parts), np.concatenate(threshold_parts)
+    
+    @staticmethod
+    def _group_times(times, ticks, threshold_ids, n_thresholds):
+        """Agrupa os tempos de disparo por limite, em ordem cronológica"""
+        order = np.lexsort((ticks, threshold_ids))
+        ticks = ticks[order]
+        splits = np.cumsum(np.bincount(threshold_ids, minlength=n_thresholds))[:-1]
+        return np.split(times[ticks], splits)
+    
+    def backtest_price_alerts(self, symbol, targets, currency=DEFAULT_CURRENCY):
+        """Retorna, para cada preço alvo, os instantes em que ele teria sido cruzado"""
+        targets = np.asarray(targets, dtype=float)
+        times, prices = self.data_manager.get_history_arrays(price_column(symbol, currency))
+        ticks, threshold_ids = self._crossings(prices, targets)
+        return self._group_times(times, ticks, threshold_ids, len(targets))
+    
+    def backtest_percent_alerts(self, symbol, targets, currency=DEFAULT_CURRENCY):
+        """Retorna, para cada variação alvo, os instantes em que ela teria sido atingida"""
+        targets = np.asarray(targets, dtype=float)
+        times, prices = self.data_manager.get_history_arrays(price_column(symbol, currency))
+        if len(times) == 0:
+            return [times[:0] for _ in targets]
+        
+        # Variação de cada tick em relação ao primeiro preço da sua janela de 24h
+        window = np.timedelta64(PERCENT_ALERT_WINDOW)
+        start = np.searchsorted(times, times - window, side='left')
+        base = prices[start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percents = np.where(base != 0, (prices - base) / base * 100, np.nan)
+        
+        # Alvos positivos disparam ao subir até o limite e negativos ao cair até ele
+        ticks_parts, ids_parts = [], []
+        for direction, mask in (('up', targets > 0), ('down', targets < 0)):
+            ids = np.flatnonzero(mask)
+            ticks, local_ids = self._crossings(percents, targets[ids], direction)
+            ticks_parts.append(ticks)
+            ids_parts.append(ids[local_ids])
+        
+        return self._group_times(times, np.concatenate(ticks_parts),
+                                 np.concatenate(ids_parts), len(targets))
+    
+    def run(self, price_alerts, percent_alerts):
+        """Executa o backtest de alertas no formato usado pelo AlertManager
+        
+        Retorna uma lista com um resultado por alerta: símbolo, tipo, moeda, alvo e os
+        instantes (datetime64) em que o alerta teria sido acionado.
+        """
+        results = []
+        for alerts, alert_type, key, method in (
+            (price_alerts, 'price', 'value', self.backtest_price_alerts),
+            (percent_alerts, 'percent', 'percent', self.backtest_percent_alerts),
+        ):
+            for symbol, symbol_alerts in alerts.items():
+                # Uma única passada por moeda de cotação, com todos os alvos juntos
+                by_currency = {}
+                for alert in symbol_alerts:
+                    by_currency.setdefault(alert.get('currency', DEFAULT_CURRENCY), []).append(alert[key])
+                for currency, targets in by_currency.items():
+                    for target, trigger_times in zip(targets, method(symbol, targets, currency)):
+                        results.append({
+                            'symbol': symbol,
+                            'type': alert_type,
+                            'currency': currency,
+                            'target': target,
+                            'times': trigger_times,
+                        })
+        return results
+
+# Balde de fichas para respeitar o limite de requisições da API
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # fichas por segundo
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def try_acquire(self):
+        """Consome uma ficha se houver; retorna False quando o orçamento acabou"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+    
+    def acquire(self):
+        """Aguarda até haver uma ficha disponível e a consome"""
+        while not self.try_acquire():
+            with self.lock:
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(max(wait, 0.01))
+    
+    def drain(self):
+        """Esvazia o balde (usado quando a API recusa por excesso de requisições)"""
+        with self.lock:
+            self._refill()
+            self.tokens = 0
+
+# Agendador da coleta de dados em cadência fixa
+class IngestScheduler:
+    """Executa a coleta em uma grade fixa de horários (sem deriva acumulada).
+    
+    Ticks que passaram enquanto uma coleta lenta estava em andamento são pulados em vez de
+    executados em sequência. As requisições respeitam API_RATE_LIMIT e, após um 429, a
+    coleta é pausada com espera exponencial que volta a diminuir a cada sucesso.
+    """
+    def __init__(self, data_manager, alert_manager, interval=UPDATE_INTERVAL,
+                 rate_limit=API_RATE_LIMIT, max_backoff=MAX_BACKOFF):
+        self.data_manager = data_manager
+        self.alert_manager = alert_manager
+        self.interval = interval
+        self.rate_limit = rate_limit
+        self.max_backoff = max_backoff
+        # Permite uma pequena rajada, mas nunca mais que o limite por minuto
+        self.bucket = TokenBucket(rate_limit / 60.0, max(1, min(rate_limit, 5)))
+        self.backoff = 0  # segundos de espera após o último 429
+        self.paused_until = 0.0
+        self.stop_event = threading.Event()
+    
+    def tick(self):
+        """Executa uma coleta, se o orçamento de requisições permitir"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        if not self.bucket.try_acquire():
+            print("Coleta adiada: limite de requisições atingido")
+            return False
+        
+        changed = self.data_manager.update_data()
+        
+        if self.data_manager.last_status_code == 429:
+            self.bucket.drain()
+            # Primeira pausa já é o dobro do intervalo e dobra a cada 429 seguido
+            self.backoff = min(self.max_backoff, max(2 * self.interval, self.backoff * 2))
+            wait = max(self.backoff, self.data_manager.retry_after or 0)
+            self.paused_until = time.monotonic() + wait
+            print(f"Coleta pausada por {wait:.0f} segundos")
+            return False
+        if self.data_manager.last_status_code == 200:
+            # Cai pela metade a cada sucesso; um novo 429 logo depois volta a dobrar a partir daqui
+            self.backoff /= 2
+            if self.backoff < self.interval:
+                self.backoff = 0
+        
+        # Preços repetidos não geram gravação nem verificação de alertas
+        if changed:
+            self.alert_manager.check_alerts(self.data_manager)
+        return changed
+    
+    def run(self):
+        next_run = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Erro na coleta de dados: {e}")
+            
+            # Próximo horário da grade; horários já perdidos são pulados
+            next_run += self.interval
+            now = time.monotonic()
+            if next_run <= now:
+                next_run += math.ceil((now - next_run) / self.interval) * self.interval
+                if next_run <= now:
+                    next_run += self.interval
+            self.stop_event.wait(next_run - now)
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    def spare_rate_limit(self):
+        """Requisições por minuto que sobram para outras tarefas após reservar as da coleta"""
+        return max(1, self.rate_limit - math.ceil(60 / self.interval))
+
+# Classe para importar histórico em massa de uma API no estilo market_chart
+class HistoryBackfiller:
+    """Preenche o histórico buscando intervalos de tempo em paralelo.
+    
+    Cada bloco (criptomoeda, moeda de cotação, início, fim) concluído é gravado em
+    BACKFILL_FILE assim que chega, então uma importação interrompida continua de onde parou.
+    Ao final, todos os blocos são mesclados ao CryptoDataManager com uma única inserção
+    ordenada e sem duplicatas.
+    """
+    def __init__(self, data_manager, api_url=COINGECKO_API_URL, workers=4,
+                 chunk=datetime.timedelta(days=1), resolution=BACKFILL_RESOLUTION,
+                 rate_limit=API_RATE_LIMIT, spool_file=BACKFILL_FILE, retries=5):
+        self.data_manager = data_manager
+        self.api_url = api_url.rstrip('/')
+        self.workers = workers
+        self.chunk_seconds = int(chunk.total_seconds())
+        self.resolution = resolution
+        # Com o servidor rodando, use IngestScheduler.spare_rate_limit() para não atrasar a coleta
+        self.bucket = TokenBucket(rate_limit / 60.0, max(1, min(rate_limit, workers)))
+        self.spool_file = spool_file
+        self.retries = retries
+    
+    def plan_chunks(self, start, end):
+        """Divide [start, end) (segundos Unix) em blocos alinhados, para cada moeda e cotação
+        
+        O alinhamento fixo garante que uma nova execução gere os mesmos blocos e possa
+        reaproveitar os que já foram baixados.
+        """
+        chunks = []
+        boundary = (int(start) // self.chunk_seconds) * self.chunk_seconds
+        while boundary < end:
+            chunk_start = max(boundary, int(start))
+            chunk_end = min(boundary + self.chunk_seconds, int(end))
+            for symbol in self.data_manager.symbols:
+                for currency in QUOTE_CURRENCIES:
+                    chunks.append((symbol, currency, chunk_start, chunk_end))
+            boundary += self.chunk_seconds
+        return chunks
+    
+    def fetch_chunk(self, symbol, currency, start, end):
+        """Busca os preços de uma moeda em uma cotação entre start e end (segundos Unix)"""
+        url = f"{self.api_url}/coins/{COINGECKO_IDS[symbol]}/market_chart/range"
+        params = {'vs_currency': currency, 'from': start, 'to': end}
+        wait = 1.0
+        for attempt in range(self.retries):
+            self.bucket.acquire()
+            response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 429:
+                self.bucket.drain()
+                retry_after = response.headers.get('Retry-After')
+                time.sleep(int(retry_after) if retry_after and retry_after.isdigit() else wait)
+                wait = min(wait * 2, MAX_BACKOFF)
+                continue
+            if response.status_code != 200:
+                raise RuntimeError(f"Erro na API: {response.status_code}")
+            # Mantém apenas pontos dentro do bloco; as bordas repetidas entre blocos são descartadas
+            return [point for point in response.json().get('prices', [])
+                    if start * 1000 <= point[0] < end * 1000]
+        raise RuntimeError("Limite de requisições da API excedido")
+    
+    def _load_spool(self):
+        """Lê o plano e os blocos já baixados por uma execução anterior
+        
+        Retorna (plano, blocos). O plano é None se não houver importação em andamento.
+        """
+        plan = None
+        done = {}
+        if not os.path.exists(self.spool_file):
+            return plan, done
+        with open(self.spool_file, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Linha incompleta de uma execução interrompida
+                if 'plan' in entry:
+                    plan = entry['plan']
+                else:
+                    # Blocos gravados antes da importação por cotação são em BRL
+                    currency = entry.get('currency', DEFAULT_CURRENCY)
+                    done[(entry['symbol'], currency, entry['start'], entry['end'])] = entry['prices']
+        if plan is None:
+            # Arquivo sem cabeçalho: não é possível saber o intervalo planejado
+            done = {}
+        return plan, done
+    
+    def _build_frame(self, done):
+        """Monta um DataFrame ordenado e sem duplicatas a partir dos blocos baixados"""
+        names = [price_column(symbol, currency)
+                 for currency in QUOTE_CURRENCIES for symbol in self.data_manager.symbols]
+        series_by_column = {}
+        for (symbol, currency, _, _), prices in done.items():
+            if prices:
+                series_by_column.setdefault(price_column(symbol, currency), []).append(
+                    np.asarray(prices, dtype=float).reshape(-1, 2))
+        
+        columns = {}
+        for column, points in series_by_column.items():
+            points = np.concatenate(points)
+            # Arredonda para a resolução da importação para que as moedas compartilhem linhas
+            times = pd.to_datetime(points[:, 0], unit='ms', utc=True)
+            times = times.tz_convert(LOCAL_TIMEZONE).tz_localize(None).floor(self.resolution)
+            series = pd.Series(points[:, 1], index=times)
+            columns[column] = series[~series.index.duplicated(keep='last')]
+        
+        if not columns:
+            return pd.DataFrame(columns=names)
+        frame = pd.concat(columns, axis=1).reindex(columns=names)
+        return frame.sort_index()
+    
+    def run(self, days=30):
+        """Importa os últimos `days` dias anteriores ao histórico existente
+        
+        Retorna o número de linhas inseridas, ou None se algum bloco falhou (nesse caso,
+        basta executar novamente para retomar).
+        """
+        plan, done = self._load_spool()
+        if plan is not None:
+            # Retoma com o mesmo intervalo, para que todos os blocos coincidam com os já baixados
+            start, end = plan['start'], plan['end']
+            print("Retomando importação anterior")
+        else:
+            end = self.data_manager.get_first_timestamp()
+            # datetime sem fuso em hora local: timestamp() usa o fuso do sistema
+            end = end.to_pydatetime().timestamp() if end is not None else time.time()
+            start = end - days * 86400
+            with open(self.spool_file, 'w') as spool:
+                spool.write(json.dumps({'plan': {'start': start, 'end': end}}) + '\n')
+        
+        chunks = self.plan_chunks(start, end)
+        pending = [chunk for chunk in chunks if chunk not in done]
+        print(f"Backfill: {len(chunks)} blocos, {len(chunks) - len(pending)} já baixados")
+        
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                open(self.spool_file, 'a') as spool:
+            futures = {executor.submit(self.fetch_chunk, *chunk): chunk for chunk in pending}
+            for future in as_completed(futures):
+                symbol, currency, chunk_start, chunk_end = futures[future]
+                try:
+                    prices = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Erro ao buscar {symbol}/{currency.upper()} ({chunk_start}-{chunk_end}): {e}")
+                    continue
+                spool.write(json.dumps({'symbol': symbol, 'currency': currency, 'start': chunk_start,
+                                        'end': chunk_end, 'prices': prices}) + '\n')
+                spool.flush()
+                done[(symbol, currency, chunk_start, chunk_end)] = prices
+        
+        if failed:
+            print(f"Backfill incompleto: {failed} blocos falharam. Execute novamente para retomar.")
+            return None
+        
+        frame = self._build_frame({chunk: done[chunk] for chunk in chunks})
+        frame = frame[frame.index < pd.Timestamp(end, unit='s', tz='UTC')
+                      .tz_convert(LOCAL_TIMEZONE).tz_localize(None)]
+        inserted = self.data_manager.bulk_insert(frame)
+        os.remove(self.spool_file)
+        print(f"Backfill concluído: {inserted} linhas inseridas")
+        return inserted
+
+# Classe para exportar o histórico em blocos, sem carregar o intervalo inteiro na memória
+class HistoryExporter:
+    FORMATS = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+        'arrow': 'application/vnd.apache.arrow.stream',
+    }
+    RESOLUTIONS = {
+        'raw': None,
+        '1m': pd.Timedelta(minutes=1),
+        '5m': pd.Timedelta(minutes=5),
+        '15m': pd.Timedelta(minutes=15),
+        '1h': pd.Timedelta(hours=1),
+        '1d': pd.Timedelta(days=1),
+    }
+    
+    def __init__(self, data_manager, chunk_rows=EXPORT_CHUNK_ROWS):
+        self.data_manager = data_manager
+        self.chunk_rows = chunk_rows
+    
+    def query(self, symbols, start=None, end=None):
+        """Localiza o intervalo [start, end] no histórico
+        
+        Retorna (frame, índice de tempos, primeira posição, posição final). O frame é a
+        versão atual do histórico, obtida sem cópia: as gravações substituem o DataFrame
+        em vez de alterá-lo, então a leitura não precisa manter o lock.
+        """
+        frame = self.data_manager.snapshot()
+        if frame.empty:
+            return frame, pd.DatetimeIndex([]), 0, 0
+        index = pd.DatetimeIndex(pd.to_datetime(frame.index))
+        lo = 0 if start is None else index.searchsorted(start, side='left')
+        hi = len(index) if end is None else index.searchsorted(end, side='right')
+        return frame, index, lo, max(lo, hi)
+    
+    def etag(self, index, lo, hi, symbols, resolution, fmt):
+        """ETag do intervalo: muda quando linhas entram ou saem dele"""
+        first = index[lo].value if hi > lo else 0
+        last = index[hi - 1].value if hi > lo else 0
+        key = f"{','.join(symbols)}|{resolution}|{fmt}|{hi - lo}|{first}|{last}"
+        return hashlib.sha1(key.encode()).hexdigest()
+    
+    def iter_frames(self, frame, index, lo, hi, symbols, resolution='raw'):
+        """Gera o intervalo em blocos de no máximo chunk_rows linhas do histórico
+        
+        Com resolução agregada, cada bloco termina na borda de um intervalo: o último
+        intervalo, possivelmente incompleto, é levado para o bloco seguinte.
+        """
+        step = self.RESOLUTIONS[resolution]
+        carry = None
+        for pos in range(lo, hi, self.chunk_rows):
+            next_pos = min(pos + self.chunk_rows, hi)
+            chunk = frame.iloc[pos:next_pos].reindex(columns=symbols)
+            chunk = chunk.apply(pd.to_numeric, errors='coerce').set_axis(index[pos:next_pos])
+            if step is not None:
+                # Último preço de cada intervalo (groupby não cria linhas para intervalos vazios)
+                chunk = chunk.groupby(chunk.index.floor(step)).last()
+                if carry is not None:
+                    if chunk.index[0] == carry.index[0]:
+                        # Mesmo intervalo: valores novos prevalecem, os anteriores completam
+                        chunk = pd.concat([chunk.iloc[[0]].fillna(carry.iloc[0]), chunk.iloc[1:]])
+                    else:
+                        chunk = pd.concat([carry, chunk])
+                carry = chunk.iloc[[-1]] if next_pos < hi else None
+                if carry is not None:
+                    chunk = chunk.iloc[:-1]
+            # Linhas sem nenhuma das colunas pedidas (ex: antes da coleta em USD) não são exportadas
+            chunk = chunk.dropna(how='all')
+            if chunk.empty:
+                continue
+            chunk.index.name = 'timestamp'
+            yield chunk
+    
+    def iter_csv(self, frames, symbols):
+        header = True
+        for chunk in frames:
+            yield chunk.to_csv(header=header)
+            header = False
+        if header:
+            yield pd.DataFrame(columns=['timestamp'] + symbols).to_csv(index=False)
+    
+    def iter_ndjson(self, frames):
+        for chunk in frames:
+            if not chunk.empty:
+                lines = chunk.reset_index().to_json(orient='records', lines=True, date_format='iso',
+                                                    double_precision=15)
+                yield lines.rstrip('\n') + '\n'
+    
+    def iter_arrow(self, frames, symbols):
+        schema = pa.schema([('timestamp', pa.timestamp('ns'))] + [(symbol, pa.float64()) for symbol in symbols])
+        sink = io.BytesIO()
+        
+        def drain():
+            data = sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+            return data
+        
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for chunk in frames:
+                writer.write_table(pa.Table.from_pandas(chunk.reset_index(), schema=schema, preserve_index=False))
+                yield drain()
+        yield drain()
 
 # Inicializa o gerenciador de dados
 data_manager = CryptoDataManager(CRYPTO_SYMBOLS)
@@ -279,17 +1454,27 @@ data_manager = CryptoDataManager(CRYPTO_SYMBOLS)
 # Inicializa o gerenciador de alertas
 alert_manager = AlertManager()
 
-# Função para atualizar dados em background
-def update_data_periodically():
-    while True:
-        data_manager.update_data()
-        # Verifica alertas após cada atualização de dados
-        alert_manager.check_alerts(data_manager)
-        time.sleep(UPDATE_INTERVAL)
+# Inicializa o simulador de alertas sobre o histórico
+alert_backtester = AlertBacktester(data_manager)
+
+# Inicializa o exportador de histórico
+history_exporter = HistoryExporter(data_manager)
+
+# Inicializa o agendador de coleta em background
+ingest_scheduler = IngestScheduler(data_manager, alert_manager)
+
+# Thread de atualização
+update_thread = threading.Thread(target=ingest_scheduler.run, daemon=True)
+
+def start_ingest():
+    """Inicia a coleta em background (apenas uma vez por processo)"""
+    if update_thread.ident is None:
+        update_thread.start()
 
-# Inicia thread de atualização
-update_thread = threading.Thread(target=update_data_periodically, daemon=True)
-update_thread.start()
+# Importado por um servidor WSGI (ex: gunicorn app:server) a coleta inicia já; executado
+# diretamente, o __main__ a inicia, exceto no comando backfill
+if __name__ != "__main__":
+    start_ingest()
 
 # Configura a aplicação Dash
 app = dash.Dash(__name__, 
@@ -327,8 +1512,20 @@ app.layout = html.Div(
         html.Div(
             [
                 html.H1("Dashboard de Monitoramento de Criptomoedas", className="header-title"),
-                html.P("Monitoramento em tempo real em Real (BRL): Bitcoin, Ethereum, Dólar Digital e Solana", 
+                html.P("Monitoramento em tempo real em Real (BRL), Dólar (USD) e Euro (EUR): Bitcoin, Ethereum, Dólar Digital e Solana", 
                        className="header-description"),
+                html.Div([
+                    html.Label("Moeda de cotação:"),
+                    dcc.RadioItems(
+                        id="currency-selector",
+                        options=[
+                            {"label": currency.upper(), "value": currency}
+                            for currency in QUOTE_CURRENCIES
+                        ],
+                        value=DEFAULT_CURRENCY,
+                        className="period-selector",
+                    ),
+                ], className="currency-control"),
                 html.Div([
                     html.Button(
                         "Ativar Notificações na Área de Trabalho", 
@@ -441,7 +1638,22 @@ app.layout = html.Div(
                                         ),
                                         html.Div(
                                             [
-                                                html.Label("Preço Alvo (R$):"),
+                                                html.Label("Moeda de Cotação:"),
+                                                dcc.Dropdown(
+                                                    id="price-alert-currency",
+                                                    options=[
+                                                        {"label": currency.upper(), "value": currency}
+                                                        for currency in QUOTE_CURRENCIES
+                                                    ],
+                                                    value=DEFAULT_CURRENCY,
+                                                    clearable=False,
+                                                ),
+                                            ],
+                                            className="alert-input-group",
+                                        ),
+                                        html.Div(
+                                            [
+                                                html.Label("Preço Alvo:"),
                                                 dcc.Input(
                                                     id="price-alert-value",
                                                     type="number",
@@ -487,6 +1699,21 @@ app.layout = html.Div(
                                             ],
                                             className="alert-input-group",
                                         ),
+                                        html.Div(
+                                            [
+                                                html.Label("Moeda de Cotação:"),
+                                                dcc.Dropdown(
+                                                    id="percent-alert-currency",
+                                                    options=[
+                                                        {"label": currency.upper(), "value": currency}
+                                                        for currency in QUOTE_CURRENCIES
+                                                    ],
+                                                    value=DEFAULT_CURRENCY,
+                                                    clearable=False,
+                                                ),
+                                            ],
+                                            className="alert-input-group",
+                                        ),
                                         html.Div(
                                             [
                                                 html.Label("Variação (%):"),
@@ -511,6 +1738,119 @@ app.layout = html.Div(
                                 html.Div(id="percent-alerts-list", className="alerts-list"),
                             ],
                         ),
+                        
+                        # Tab de alertas por regra composta
+                        dcc.Tab(
+                            label="Alertas por Regra",
+                            value="rule-alerts",
+                            children=[
+                                html.Div(
+                                    [
+                                        html.Div(
+                                            [
+                                                html.Label("Regra:"),
+                                                dcc.Input(
+                                                    id="rule-alert-expression",
+                                                    type="text",
+                                                    placeholder="Ex: SOL.change(24h) >= 5 AND BTC CROSSES ABOVE BTC.ema(50)",
+                                                    className="alert-input",
+                                                ),
+                                            ],
+                                            className="alert-input-group",
+                                        ),
+                                        html.Button(
+                                            "Adicionar Alerta",
+                                            id="add-rule-alert-button",
+                                            className="alert-button",
+                                        ),
+                                    ],
+                                    className="alert-form",
+                                ),
+                                html.P(
+                                    "Séries: BTC (preço em BRL), BTC_USD, BTC_EUR, BTC.ema(50), BTC.change(24h), BTC.volatility(1h). "
+                                    "Operadores: >, <, >=, <=, CROSSES, CROSSES ABOVE, CROSSES BELOW, AND, OR, NOT.",
+                                    className="rule-help",
+                                ),
+                                html.Div(id="rule-alert-error", className="rule-error"),
+                                html.Div(id="rule-alerts-list", className="alerts-list"),
+                            ],
+                        ),
+                        
+                        # Tab de backtest de alertas sobre o histórico
+                        dcc.Tab(
+                            label="Backtest de Alertas",
+                            value="backtest-alerts",
+                            children=[
+                                html.Div(
+                                    [
+                                        html.Div(
+                                            [
+                                                html.Label("Criptomoeda:"),
+                                                dcc.Dropdown(
+                                                    id="backtest-crypto",
+                                                    options=[
+                                                        {"label": CRYPTO_NAMES[symbol], "value": symbol}
+                                                        for symbol in CRYPTO_SYMBOLS
+                                                    ],
+                                                    value="BTC",
+                                                    clearable=False,
+                                                ),
+                                            ],
+                                            className="alert-input-group",
+                                        ),
+                                        html.Div(
+                                            [
+                                                html.Label("Moeda de Cotação:"),
+                                                dcc.Dropdown(
+                                                    id="backtest-currency",
+                                                    options=[
+                                                        {"label": currency.upper(), "value": currency}
+                                                        for currency in QUOTE_CURRENCIES
+                                                    ],
+                                                    value=DEFAULT_CURRENCY,
+                                                    clearable=False,
+                                                ),
+                                            ],
+                                            className="alert-input-group",
+                                        ),
+                                        html.Div(
+                                            [
+                                                html.Label("Tipo de Alerta:"),
+                                                dcc.RadioItems(
+                                                    id="backtest-type",
+                                                    options=[
+                                                        {"label": "Preço", "value": "price"},
+                                                        {"label": "Variação (%)", "value": "percent"},
+                                                    ],
+                                                    value="price",
+                                                    className="period-selector",
+                                                ),
+                                            ],
+                                            className="alert-input-group",
+                                        ),
+                                        html.Div(
+                                            [
+                                                html.Label("Valores (separados por vírgula):"),
+                                                dcc.Input(
+                                                    id="backtest-values",
+                                                    type="text",
+                                                    placeholder="Vazio para testar os alertas configurados",
+                                                    className="alert-input",
+                                                ),
+                                            ],
+                                            className="alert-input-group",
+                                        ),
+                                        html.Button(
+                                            "Executar Backtest",
+                                            id="run-backtest-button",
+                                            className="alert-button",
+                                        ),
+                                    ],
+                                    className="alert-form",
+                                ),
+                                html.Div(id="backtest-results", className="alerts-list"),
+                            ],
+                        ),
                     ],
                 ),
             ],
@@ -522,6 +1862,7 @@ app.layout = html.Div(
             [
                 html.P("Última atualização: ", style={"display": "inline-block"}),
                 html.P(id="last-update-time", style={"display": "inline-block"}),
+                html.P(id="cross-rates", className="cross-rates"),
             ],
             className="footer",
         ),
@@ -547,8 +1888,10 @@ app.layout = html.Div(
     Input("interval-component", "n_intervals"),
 )
 def update_triggered_alerts(n):
-    triggered_alerts = alert_manager.check_alerts(data_manager)
-    return triggered_alerts
+    # Só reavalia quando há uma linha nova; a coleta em background normalmente já verificou
+    if alert_manager.has_new_data(data_manager):
+        alert_manager.check_alerts(data_manager)
+    return alert_manager.pop_notifications()
 
 # Callback para mostrar notificações de alertas
 @app.callback(
@@ -564,7 +1907,11 @@ def display_alert_notifications(triggered_alerts):
     notifications = []
     for alert in triggered_alerts:
         # Apenas mostrar alertas não vistos
-        alert_class = "price-alert-notification" if alert['type'] == 'price' else "percent-alert-notification"
+        alert_class = {
+            'price': "price-alert-notification",
+            'percent': "percent-alert-notification",
+            'rule': "rule-alert-notification",
+        }.get(alert['type'], "percent-alert-notification")
         notification = html.Div(
             [
                 html.Span(alert['message']),
@@ -615,7 +1962,8 @@ def update_price_alerts_list(n):
             
             alert_item = html.Div(
                 [
-                    html.Span(f"Preço: R$ {alert['value']:,.2f}", className="alert-value"),
+                    html.Span(f"Preço: {CURRENCY_SYMBOLS[alert.get('currency', DEFAULT_CURRENCY)]} {alert['value']:,.2f}",
+                              className="alert-value"),
                     html.Span(f"Status: {status}", className=f"alert-status {status_class}"),
                     html.Button(
                         "Remover",
@@ -654,7 +2002,8 @@ def update_percent_alerts_list(n):
             
             alert_item = html.Div(
                 [
-                    html.Span(f"{direction.capitalize()} {abs(alert['percent']):,.2f}%", className="alert-value"),
+                    html.Span(f"{direction.capitalize()} {abs(alert['percent']):,.2f}% em {alert.get('currency', DEFAULT_CURRENCY).upper()}",
+                              className="alert-value"),
                     html.Span(f"Status: {status}", className=f"alert-status {status_class}"),
                     html.Button(
                         "Remover",
@@ -672,15 +2021,52 @@ def update_percent_alerts_list(n):
     
     return alerts_list
 
+# Callback para atualizar a lista de alertas por regra
+@app.callback(
+    Output("rule-alerts-list", "children"),
+    Input("interval-component", "n_intervals"),
+)
+def update_rule_alerts_list(n):
+    alerts_list = []
+    
+    for i, alert in enumerate(alert_manager.rule_alerts):
+        status = "Acionado" if alert['triggered'] else "Ativo"
+        status_class = "alert-triggered" if alert['triggered'] else "alert-active"
+        
+        alert_item = html.Div(
+            [
+                html.Span(alert['expression'], className="alert-value"),
+                html.Span(f"Status: {status}", className=f"alert-status {status_class}"),
+                html.Button(
+                    "Remover",
+                    id=f"remove-rule-alert-{i}",
+                    className="remove-alert-button",
+                    n_clicks=0,
+                ),
+            ],
+            className="alert-item",
+        )
+        alerts_list.append(alert_item)
+    
+    if not alerts_list:
+        alerts_list.append(html.P("Não há alertas por regra configurados.", className="no-alerts"))
+    
+    return alerts_list
+
 @app.callback(
     [Output(f"{symbol}-price", "children") for symbol in CRYPTO_SYMBOLS] +
     [Output(f"{symbol}-change", "children") for symbol in CRYPTO_SYMBOLS] +
     [Output(f"{symbol}-change", "className") for symbol in CRYPTO_SYMBOLS] +
-    [Output("last-update-time", "children")],
-    Input("interval-component", "n_intervals"),
+    [Output("last-update-time", "children"),
+     Output("cross-rates", "children")],
+    [Input("interval-component", "n_intervals"),
+     Input("currency-selector", "value")],
 )
-def update_price_cards(n):
+def update_price_cards(n, currency):
     latest_prices = data_manager.get_latest_prices()
+    # Câmbio já calculado na última coleta; nada é recalculado aqui
+    cross_rates = data_manager.get_cross_rates()
+    currency_symbol = CURRENCY_SYMBOLS[currency]
     
     # Busca os dados mais recentes para calcular a variação de preço
     price_outputs = []
@@ -689,16 +2075,22 @@ def update_price_cards(n):
     
     for symbol in CRYPTO_SYMBOLS:
         # Preços
-        price = latest_prices.get(symbol, 0)
-        price_text = f"R$ {price:,.2f}" if price else "Indisponível"
+        column = price_column(symbol, currency)
+        price = latest_prices.get(column, 0)
+        if pd.isna(price) or not price:
+            # Sem cotação direta nesta moeda: converte a partir do BRL pelo câmbio em cache
+            brl_price = latest_prices.get(symbol, 0)
+            rate = cross_rates.get(DEFAULT_CURRENCY, {}).get(currency)
+            price = brl_price * rate if brl_price and rate and not pd.isna(brl_price) else 0
+        price_text = f"{currency_symbol} {price:,.2f}" if price else "Indisponível"
         price_outputs.append(price_text)
         
         # Calcula a variação em 24h (simulada para este exemplo)
         # Em um cenário real, isso seria calculado com dados históricos
-        df = data_manager.get_historical_data(symbol, '1d')
+        df = data_manager.get_historical_data(column, '1d').dropna()
         if not df.empty and len(df) > 1:
-            first_price = df.iloc[0][symbol]
-            last_price = df.iloc[-1][symbol]
+            first_price = df.iloc[0][column]
+            last_price = df.iloc[-1][column]
             change_pct = ((last_price - first_price) / first_price) * 100 if first_price else 0
             change_text = f"{change_pct:+.2f}%"
             change_class = "price-change price-up" if change_pct >= 0 else "price-change price-down"
@@ -712,16 +2104,28 @@ def update_price_cards(n):
     # Última atualização
     update_time = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
     
-    return price_outputs + change_text_outputs + change_class_outputs + [update_time]
+    # Câmbio entre a moeda selecionada e as demais
+    rates_text = " | ".join(
+        f"{currency_symbol} 1 = {CURRENCY_SYMBOLS[quote]} {rate:,.4f}"
+        for quote, rate in cross_rates.get(currency, {}).items()
+        if quote != currency
+    )
+    
+    return price_outputs + change_text_outputs + change_class_outputs + [update_time, rates_text]
 
 @app.callback(
     Output("price-chart", "figure"),
     [Input("crypto-dropdown", "value"), 
      Input("time-period", "value"),
-     Input("interval-component", "n_intervals")],
+     Input("interval-component", "n_intervals"),
+     Input("currency-selector", "value")],
 )
-def update_chart(crypto, period, n):
-    df = data_manager.get_historical_data(crypto, period)
+def update_chart(crypto, period, n, currency):
+    column = price_column(crypto, currency)
+    df = data_manager.get_historical_data(column, period)
+    if not df.empty:
+        # Linhas anteriores à coleta desta moeda não têm cotação
+        df = df.dropna()
     
     if df.empty:
         # Retorna um gráfico vazio se não houver dados
@@ -730,7 +2134,7 @@ def update_chart(crypto, period, n):
             "layout": {
                 "title": f"Não há dados disponíveis para {CRYPTO_NAMES.get(crypto, crypto)}",
                 "xaxis": {"title": "Tempo"},
-                "yaxis": {"title": "Preço (BRL)"},
+                "yaxis": {"title": f"Preço ({currency.upper()})"},
             },
         }
     
@@ -740,7 +2144,7 @@ def update_chart(crypto, period, n):
     fig.add_trace(
         plt.Scatter(
             x=df.index,
-            y=df[crypto],
+            y=df[column],
             mode="lines",
             name=CRYPTO_NAMES.get(crypto, crypto),
             line=dict(width=2, color="#2E86C1"),
@@ -753,7 +2157,7 @@ def update_chart(crypto, period, n):
     fig.update_layout(
         title=f"Preço de {CRYPTO_NAMES.get(crypto, crypto)} - {period}",
         xaxis_title="Tempo",
-        yaxis_title="Preço (BRL)",
+        yaxis_title=f"Preço ({currency.upper()})",
         template="plotly_white",
         hovermode="x unified",
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
@@ -768,13 +2172,14 @@ def update_chart(crypto, period, n):
     Input("add-price-alert-button", "n_clicks"),
     State("price-alert-crypto", "value"),
     State("price-alert-value", "value"),
+    State("price-alert-currency", "value"),
     prevent_initial_call=True,
 )
-def add_price_alert(n_clicks, crypto, price_value):
+def add_price_alert(n_clicks, crypto, price_value, currency):
     if n_clicks is None or crypto is None or price_value is None:
         raise PreventUpdate
     
-    alert_manager.add_price_alert(crypto, float(price_value))
+    alert_manager.add_price_alert(crypto, float(price_value), currency or DEFAULT_CURRENCY)
     return 0  # Reset n_clicks
 
 # Callback para adicionar alerta de variação percentual
@@ -783,18 +2188,180 @@ def add_price_alert(n_clicks, crypto, price_value):
     Input("add-percent-alert-button", "n_clicks"),
     State("percent-alert-crypto", "value"),
     State("percent-alert-value", "value"),
+    State("percent-alert-currency", "value"),
     prevent_initial_call=True,
 )
-def add_percent_alert(n_clicks, crypto, percent_value):
+def add_percent_alert(n_clicks, crypto, percent_value, currency):
     if n_clicks is None or crypto is None or percent_value is None:
         raise PreventUpdate
     
-    alert_manager.add_percent_alert(crypto, float(percent_value))
+    alert_manager.add_percent_alert(crypto, float(percent_value), currency or DEFAULT_CURRENCY)
     return 0  # Reset n_clicks
 
+# Callback para adicionar alerta por regra composta
+@app.callback(
+    [Output("add-rule-alert-button", "n_clicks"),
+     Output("rule-alert-error", "children")],
+    Input("add-rule-alert-button", "n_clicks"),
+    State("rule-alert-expression", "value"),
+    prevent_initial_call=True,
+)
+def add_rule_alert(n_clicks, expression):
+    if n_clicks is None or not expression:
+        raise PreventUpdate
+    
+    try:
+        alert_manager.add_rule_alert(expression)
+    except ValueError as e:
+        return 0, f"Regra inválida: {e}"
+    return 0, ""  # Reset n_clicks
+
+# Callback para executar o backtest de alertas
+@app.callback(
+    Output("backtest-results", "children"),
+    Input("run-backtest-button", "n_clicks"),
+    State("backtest-crypto", "value"),
+    State("backtest-type", "value"),
+    State("backtest-values", "value"),
+    State("backtest-currency", "value"),
+    prevent_initial_call=True,
+)
+def run_backtest(n_clicks, crypto, alert_type, values, currency):
+    if n_clicks is None:
+        raise PreventUpdate
+    
+    if values and values.strip():
+        # Testa os valores informados para a moeda selecionada
+        try:
+            targets = [float(v.replace(' ', '')) for v in values.split(',') if v.strip()]
+        except ValueError:
+            return html.P("Valores inválidos. Use números separados por vírgula.", className="no-alerts")
+        if alert_type == 'price':
+            results = alert_backtester.run({crypto: [{'value': t, 'currency': currency} for t in targets]}, {})
+        else:
+            results = alert_backtester.run({}, {crypto: [{'percent': t, 'currency': currency} for t in targets]})
+    else:
+        # Sem valores, testa todos os alertas já configurados
+        results = alert_backtester.run(alert_manager.price_alerts, alert_manager.percent_alerts)
+    
+    if not results:
+        return html.P("Não há alertas para testar.", className="no-alerts")
+    
+    rows = []
+    for result in results:
+        target = result['target']
+        if result['type'] == 'price':
+            target_text = f"{CURRENCY_SYMBOLS[result['currency']]} {target:,.2f}"
+        else:
+            target_text = f"{target:+.2f}% ({result['currency'].upper()})"
+        times = result['times']
+        first = pd.Timestamp(times[0]).strftime("%d/%m/%Y %H:%M") if len(times) else "-"
+        last = pd.Timestamp(times[-1]).strftime("%d/%m/%Y %H:%M") if len(times) else "-"
+        rows.append(html.Tr([
+            html.Td(CRYPTO_NAMES.get(result['symbol'], result['symbol'])),
+            html.Td(target_text),
+            html.Td(f"{len(times)}"),
+            html.Td(first),
+            html.Td(last),
+        ]))
+    
+    return html.Table(
+        [html.Thead(html.Tr([html.Th(h) for h in ["Moeda", "Alvo", "Disparos", "Primeiro", "Último"]])),
+         html.Tbody(rows)],
+        className="backtest-table",
+    )
+
+# Rotas HTTP para consulta e exportação do histórico
+@server.route("/api/history")
+@server.route("/api/history/<symbol>")
+def export_history(symbol=None):
+    """Exporta o histórico em CSV, NDJSON ou Arrow IPC, transmitido em blocos
+    
+    Parâmetros: symbols=BTC,ETH (ou /api/history/BTC), currency (brl, usd, eur),
+    start e end (ISO 8601), resolution (raw, 1m, 5m, 15m, 1h, 1d) e format (csv, ndjson, arrow).
+    """
+    symbols = [symbol] if symbol else request.args.get('symbols', ','.join(CRYPTO_SYMBOLS)).split(',')
+    symbols = [s.strip().upper() for s in symbols if s.strip()]
+    unknown = [s for s in symbols if s not in CRYPTO_SYMBOLS]
+    if unknown or not symbols:
+        return jsonify({'error': f"Criptomoeda desconhecida: {', '.join(unknown)}"}), 400
+    
+    currency = request.args.get('currency', DEFAULT_CURRENCY).lower()
+    if currency not in QUOTE_CURRENCIES:
+        return jsonify({'error': f"Moeda de cotação inválida. Use: {', '.join(QUOTE_CURRENCIES)}"}), 400
+    columns = [price_column(s, currency) for s in symbols]
+    
+    resolution = request.args.get('resolution', 'raw')
+    if resolution not in HistoryExporter.RESOLUTIONS:
+        return jsonify({'error': f"Resolução inválida. Use: {', '.join(HistoryExporter.RESOLUTIONS)}"}), 400
+    fmt = request.args.get('format', 'csv')
+    if fmt not in HistoryExporter.FORMATS:
+        return jsonify({'error': f"Formato inválido. Use: {', '.join(HistoryExporter.FORMATS)}"}), 400
+    if fmt == 'arrow' and pa is None:
+        return jsonify({'error': "Formato arrow requer o pacote pyarrow"}), 400
+    
+    try:
+        start = pd.Timestamp(request.args['start']) if request.args.get('start') else None
+        end = pd.Timestamp(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': "Datas inválidas. Use o formato ISO 8601, ex: 2025-01-31T12:00"}), 400
+    # O histórico usa horário local sem fuso; datas com fuso são convertidas
+    start, end = [t.tz_convert(LOCAL_TIMEZONE).tz_localize(None) if t is not None and t.tzinfo else t
+                  for t in (start, end)]
+    
+    frame, index, lo, hi = history_exporter.query(columns, start, end)
+    etag = history_exporter.etag(index, lo, hi, columns, resolution, fmt)
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    
+    frames = history_exporter.iter_frames(frame, index, lo, hi, columns, resolution)
+    if fmt == 'csv':
+        body = history_exporter.iter_csv(frames, columns)
+    elif fmt == 'ndjson':
+        body = history_exporter.iter_ndjson(frames)
+    else:
+        body = history_exporter.iter_arrow(frames, columns)
+    
+    return Response(body, mimetype=HistoryExporter.FORMATS[fmt], headers={'ETag': f'"{etag}"'})
+
 # Executar a aplicação
+# Verifica se já há um servidor do dashboard atendendo na porta local
+def server_is_running(port=SERVER_PORT):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=1):
+            return True
+    except OSError:
+        return False
+
 if __name__ == "__main__":
-    # Busca os dados iniciais
-    data_manager.update_data()
-    # Inicia o servidor
-    app.run_server(debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Dashboard de Monitoramento de Criptomoedas")
+    parser.add_argument('command', nargs='?', choices=['backfill'],
+                        help="backfill: importa o histórico e sai (apenas com o servidor parado)")
+    parser.add_argument('--backfill', action='store_true',
+                        help="importa o histórico em segundo plano enquanto o servidor roda")
+    parser.add_argument('--days', type=float, default=30, help="dias de histórico a importar")
+    parser.add_argument('--workers', type=int, default=4, help="requisições em paralelo")
+    parser.add_argument('--chunk-days', type=float, default=1, help="tamanho de cada bloco em dias")
+    parser.add_argument('--api-url', default=COINGECKO_API_URL, help="URL base da API")
+    args = parser.parse_args()
+    
+    # Dentro do servidor a importação usa só o que sobra do limite; a coleta tem prioridade
+    rate_limit = API_RATE_LIMIT if args.command == 'backfill' else ingest_scheduler.spare_rate_limit()
+    backfiller = HistoryBackfiller(data_manager, api_url=args.api_url, workers=args.workers,
+                                   chunk=datetime.timedelta(days=args.chunk_days),
+                                   rate_limit=rate_limit)
+    
+    if args.command == 'backfill':
+        # Um servidor em execução guarda o histórico em memória e sobrescreveria a importação
+        if server_is_running():
+            print("O servidor está em execução. Pare-o ou use 'python app.py --backfill' para importar nele.")
+            sys.exit(1)
+        sys.exit(0 if backfiller.run(days=args.days) is not None else 1)
+    
+    # Inicia a coleta; os dados iniciais são buscados pelo primeiro tick do agendador
+    start_ingest()
+    if args.backfill:
+        threading.Thread(target=backfiller.run, kwargs={'days': args.days}, daemon=True).start()
+    
+    # Inicia o servidor (sem o reloader, que rodaria um segundo processo gravando o mesmo histórico)
+    app.run_server(debug=True, use_reloader=False, port=SERVER_PORT)
\ No newline at end of file